@@ -5,13 +5,15 @@ Extracts the dialogue from EarthBound and outputs it into a CCScript file.
 '''
 
 import argparse
-import array
+import bisect
 from enum import Enum
-from functools import reduce
+import functools
 from importlib.metadata import version
 import math
+import mmap
 import os
 import re
+import struct
 import time
 
 import yaml
@@ -52,17 +54,71 @@ TEXT_DATA = [[0x50000, 0x51b12],    # SRE_POINTER_TABLE
              [0x2f4e20, 0x2fa37a]]  # TEXT_DATA_EF4A40
 COMPRESSED_TEXT_PTRS = 0x8cded
 
-CONTROL_CODES = {0x00: 0, 0x01: 0, 0x02: 0, 0x03: 0, 0x04: 2, 0x05: 2, 0x06: 6,
-                 0x07: 2, 0x08: 4, 0x09: None, 0x0a: 4, 0x0b: 1, 0x0c: 1,
-                 0x0d: 1, 0x0e: 1, 0x0f: 0, 0x10: 1, 0x11: 0, 0x12: 0, 0x13: 0,
-                 0x14: 0, 0x15: 1, 0x16: 1, 0x17: 1, 0x18: None, 0x19: None,
-                 0x1a: None, 0x1b: None, 0x1c: None, 0x1d: None, 0x1e: None,
-                 0x1f: None, 0x20: 0, 0x21: 0, 0x22: 0, 0x23: 0, 0x24: 0,
-                 0x25: 0, 0x26: 0, 0x27: 0, 0x28: 0, 0x29: 0, 0x2a: 0, 0x2b: 0,
-                 0x2c: 0, 0x2d: 0, 0x2e: 0, 0x2f: 0, 0x30: 0}
-
-# per JTolmar
-BRANCHING_CODES_RE = re.compile(r'\[(?:0[69]|1B 0[23]|1F C0)')
+# The lengths of control codes [00]-[30]; None marks a variable length.
+CONTROL_CODE_LENGTHS = (0, 0, 0, 0, 2, 2, 6, 2, 4, None, 4, 1, 1, 1, 1, 0,
+                        1, 0, 0, 0, 0, 1, 1, 1) + (None,) * 8 + (0,) * 17
+
+# Lengths of the variable-length control codes, by their first two bytes.
+CONTROL_CODE_COMBOS = {
+    0x18: {0x00: 1, 0x01: 2, 0x02: 1, 0x03: 2, 0x04: 1, 0x05: 3, 0x06: 1, 0x07: 6, 0x08: 2,
+           0x09: 2, 0x0A: 1, 0x0D: 3},
+    0x19: {0x02: 1, 0x04: 1, 0x05: 4, 0x10: 2, 0x11: 2, 0x14: 1, 0x16: 3, 0x18: 2, 0x19: 3,
+           0x1A: 2, 0x1B: 2, 0x1C: 3, 0x1D: 3, 0x1E: 1, 0x1F: 1, 0x20: 1, 0x21: 2, 0x22: 5,
+           0x23: 6, 0x24: 6, 0x25: 2, 0x26: 2, 0x27: 2, 0x28: 2},
+    0x1A: {0x00: 18, 0x01: 18, 0x04: 1, 0x05: 3, 0x06: 2, 0x07: 1, 0x08: 1, 0x09: 1, 0x0a: 1,
+           0x0B: 1},
+    0x1B: {0x02: 5, 0x03: 5},
+    0x1C: {0x00: 2, 0x01: 2, 0x02: 2, 0x03: 2, 0x04: 1, 0x05: 2, 0x06: 2, 0x07: 2, 0x08: 2,
+           0x09: 1, 0x0A: 5, 0x0B: 5, 0x0C: 2, 0x0D: 1, 0x0E: 1, 0x0F: 1, 0x11: 2, 0x12: 2,
+           0x13: 3, 0x14: 2, 0x15: 2},
+    0x1D: {0x00: 3, 0x01: 3, 0x02: 2, 0x03: 2, 0x04: 3, 0x05: 3, 0x06: 5, 0x07: 5, 0x08: 3,
+           0x09: 3, 0x0A: 2, 0x0B: 2, 0x0C: 3, 0x0D: 4, 0x0E: 3, 0x0F: 3, 0x10: 3, 0x11: 3,
+           0x12: 3, 0x13: 3, 0x14: 5, 0x15: 3, 0x17: 5, 0x18: 2, 0x19: 2, 0x20: 1, 0x21: 2,
+           0x22: 1, 0x23: 2, 0x24: 2},
+    0x1E: {0x09: 5},
+    0x1F: {0x00: 3, 0x01: 2, 0x02: 2, 0x03: 1, 0x04: 2, 0x05: 1, 0x06: 1, 0x07: 2, 0x11: 2,
+           0x12: 2, 0x13: 3, 0x14: 2, 0x15: 6, 0x16: 4, 0x17: 6, 0x18: 8, 0x19: 8, 0x1A: 4,
+           0x1B: 3, 0x1C: 3, 0x1D: 2, 0x1E: 4, 0x1F: 4, 0x20: 3, 0x21: 2, 0x23: 3, 0x30: 1,
+           0x31: 1, 0x41: 2, 0x50: 1, 0x51: 1, 0x52: 2, 0x60: 2, 0x61: 1, 0x62: 2, 0x63: 5,
+           0x64: 1, 0x65: 1, 0x66: 7, 0x67: 2, 0x68: 1, 0x69: 1, 0x71: 3, 0x81: 3, 0x83: 3,
+           0x90: 1, 0xA0: 1, 0xA1: 1, 0xA2: 1, 0xB0: 1, 0xC0: None, 0xD0: 2, 0xD1: 1, 0xD2: 2,
+           0xD3: 2, 0xE1: 4, 0xE4: 4, 0xE5: 2, 0xE6: 3, 0xE7: 3, 0xE8: 2, 0xE9: 3, 0xEA: 3,
+           0xEB: 3, 0xEC: 3, 0xED: 1, 0xEE: 3, 0xEF: 3, 0xF0: 1, 0xF1: 5, 0xF2: 5, 0xF3: 4,
+           0xF4: 3},
+}
+COMBO_DEFAULT_LENGTHS = {0x1B: 1, 0x1E: 3, 0x1F: None}  # for the rest; None is unknown
+# All of them as one table indexed by (first << 8) | second, [09] included.
+COMBO_LENGTHS = tuple(
+    1 + b * 4 if c == 0x09 else
+    CONTROL_CODE_COMBOS[c].get(b, COMBO_DEFAULT_LENGTHS.get(c, 0))
+    if c in CONTROL_CODE_COMBOS else None
+    for c in range(256) for b in range(256)
+)
+
+# Runs of normal characters in the main text banks, which map to text by -0x30.
+TEXT_RUN_RE = re.compile(rb"[^\x00-\x30\x52\x8b-\x8d]+")
+TEXT_TABLE = bytes((b - 0x30) & 0xff for b in range(256))
+# The same for the coffee/tea scenes and the staff text (which is kept as hex).
+COFFEE_TEXT_RUN_RE = re.compile(rb"[\x30-\xff]+")
+STAFF_TEXT_RUN_RE = re.compile(rb"[^\x00-\x04\xff]+")
+
+# per JTolmar: [06], [09], [1B 02], [1B 03] and [1F C0]
+BRANCHING_CODES = {0x06, 0x09}
+BRANCHING_COMBOS = {b"\x1B\x02", b"\x1B\x03", b"\x1F\xC0"}
+
+def FusePatterns(patterns, prefix):
+    """Join patterns starting with "\\[" into one alternation that matches the "["
+    once, and map each alternative's name to the slice of groups() it captured."""
+    assert all(p.pattern.startswith(r"\[") for p in patterns)
+    fused = re.compile(r"\[(?:" + "|".join(f"(?P<{prefix}{i}>{p.pattern[2:]})"
+                                           for i, p in enumerate(patterns)) + ")")
+    groups = {f"{prefix}{i}": slice(fused.groupindex[f"{prefix}{i}"],
+                                    fused.groupindex[f"{prefix}{i}"] + p.groups)
+              for i, p in enumerate(patterns)}
+    return fused, groups
+
+# Control codes that may hold pointers; see getPointers and PATTERNS.
+POINTER_CODES = {0x06, 0x08, 0x09, 0x0A, 0x1A, 0x1B, 0x1F}
 
 PATTERNS = [r"\[(06 \w\w \w\w )(\w\w \w\w \w\w \w\w)]",
             r"\[(08 )(\w\w \w\w \w\w \w\w)]",
@@ -72,6 +128,12 @@ PATTERNS = [r"\[(06 \w\w \w\w )(\w\w \w\w \w\w \w\w)]",
             r"\[(1B 0[2|3] )(\w\w \w\w \w\w \w\w)\]",
             r"\[(1F 63 )(\w\w \w\w \w\w \w\w)\]",
             r"\[(1F C0 \w\w)(( \w\w \w\w \w\w \w\w)+)\]"]
+PATTERNS_RE = [re.compile(p) for p in PATTERNS]
+# Matches never overlap or form new ones, so this is the same as one pass each.
+PATTERNS_FUSED, PATTERNS_GROUPS = FusePatterns(PATTERNS_RE, "p")
+COMPRESSED_TEXT_RE = re.compile(r"\[(15|16|17) (\w\w)\]")
+# A compressed text entry, which runs up to a null byte.
+COMPRESSED_STRING_RE = re.compile(rb"[^\x00]*")
 REPLACE = [["[13][02]\"", "\" end"], ["[03][00]", "\" next\n\""],
            ["[00]", "\" linebreak\n\""], ["[01]", "\" newline\n\""],
            ["[02]\"", "\" eob"], ["[1C 08 01]  ", "{smash}",],
@@ -91,6 +153,8 @@ RE_REPLACE = [
     # two parameters
     re.compile(r"\[(18 05|1D 0[015]|1E 0[0-8A-E]|1F (?:13|20|71|81|EC)) (\w\w) (\w\w)\]"),
 ]
+# All of RE_REPLACE in one pass; alternatives keep their order, so earlier win.
+RE_REPLACE_FUSED, RE_REPLACE_GROUPS = FusePatterns(RE_REPLACE, "g")
 RE_REPLACE_TARGETS = {
     # no parameters
     "0D 00":    "{{rtoarg}}",
@@ -177,6 +241,12 @@ RE_REPLACE_TARGETS = {
     "1F 71":    "{{learnpsi({}, {})}}",
     "1F 81":    "{{usable({}, {})}}",
 }
+# The same templates split into the literal text around each parameter.
+RE_REPLACE_PARTS = {
+    cc: tuple(part.replace("{{", "{").replace("}}", "}")
+              for part in template.split("{}"))
+    for cc, template in RE_REPLACE_TARGETS.items()
+}
 
 COILSNAKE_FILES = ["attract_mode_txt.yml", "battle_action_table.yml",
                    "enemy_configuration_table.yml", "map_doors.yml",
@@ -190,6 +260,11 @@ COILSNAKE_POINTERS = ["Text Address", "Death Text Pointer",
                       "Delivery Failure Text Pointer",
                       "Delivery Success Text Pointer", "Pointer"]
 
+# Two-digit uppercase hex for every byte value, as used in control codes.
+HEX_BYTES = tuple(f"{i:02X}" for i in range(256))
+
+EVENT_FLAG_RE = re.compile(r"Event Flag: (\d+)")
+
 SPECIAL_POINTERS = [0x49ea4, 0x49ea8, 0x49eac, 0x49eb0, 0x49eb4, 0x49eb8,
                     0x49ebc, 0x49ec0, 0xcffd5]
 
@@ -208,15 +283,10 @@ HEADER = f"""/*
 # UTILITY FUNCTIONS #
 #####################
 
-def FindClosest(dictionary, searchKey):
-    "Find the closest and lowest key."
-    lower = None
-    for key in sorted(dictionary):
-        if searchKey >= key:
-            lower = key
-        else:
-            break
-    return lower
+def FindClosest(sortedKeys, searchKey):
+    "Find the closest and lowest key in a sorted list of keys."
+    idx = bisect.bisect_right(sortedKeys, searchKey)
+    return sortedKeys[idx - 1] if idx else None
 
 def test_FindClosest():
     assert FindClosest([10,20,30], 9) is None
@@ -225,14 +295,20 @@ def test_FindClosest():
     assert FindClosest([10,20,30], 20) == 20
     assert FindClosest([10,20,30], 21) == 20
     assert FindClosest([10,20,30], 10000) == 30
+    assert FindClosest([], 5) is None
 
 def FormatHex(intNum):
     "Format a hex number to a control code format."
-    return '{:02X}'.format(intNum)
+    return HEX_BYTES[intNum]
+
+def test_FormatHex():
+    assert FormatHex(0) == '00'
+    assert FormatHex(0x0a) == '0A'
+    assert FormatHex(0xff) == 'FF'
 
 def FromSNES(snesNum):
     "Converts an SNES address to a hexadecimal address."
-    return int("".join(reversed(snesNum.strip().split())), 16)
+    return int.from_bytes(bytes.fromhex(snesNum), "little")
 
 def test_FromSNES():
     assert 0 == FromSNES('00 00 00 00')
@@ -242,12 +318,22 @@ def test_FromSNES():
     assert 0x0100_0000 == FromSNES('00 00 00 01')
     assert 0xcafe_f00d == FromSNES('0D F0 FE CA')
     assert 0xcafe_f00d == FromSNES('0d f0 fe ca')
+    assert 0x1234 == FromSNES(' 34 12')
+
+def FromSNESBytes(byteSeq):
+    "Converts the four bytes of an SNES address to a hexadecimal address."
+    return int.from_bytes(bytes(byteSeq), "little")
+
+def test_FromSNESBytes():
+    assert 0 == FromSNESBytes([0, 0, 0, 0])
+    assert 1 == FromSNESBytes([1, 0, 0, 0])
+    assert 0x0100_0000 == FromSNESBytes((0, 0, 0, 1))
+    assert 0xcafe_f00d == FromSNESBytes(b'\x0d\xf0\xfe\xca')
 
 def ToSNES(hexNum):
     "Converts a hexadecimal address to an SNES address."
-    if hexNum == 0:
-        return "00 00 00 00"
-    return " ".join(reversed(re.findall(r"\w\w", "{:08X}".format(hexNum))))
+    return "{:02X} {:02X} {:02X} {:02X}".format(hexNum & 0xff, (hexNum >> 8) & 0xff,
+                                                (hexNum >> 16) & 0xff, (hexNum >> 24) & 0xff)
 
 def test_ToSNES():
     assert ToSNES(0) == '00 00 00 00'
@@ -280,6 +366,57 @@ def test_CoilSnakePointerStringToInt():
     except ValueError:
         pass
 
+def CoilSnakePointerFields(fileName, yamlData):
+    "Yield (entry, key, place) for each text pointer field in a CoilSnake YAML file."
+    if fileName != "map_doors.yml":
+        for e, v in yamlData.items():
+            for p in COILSNAKE_POINTERS:
+                if p in v:
+                    yield v, p, f"entry {e}"
+    else:
+        for e, v in yamlData.items():
+            for s, d in v.items():
+                for n, k in enumerate(d or ()):
+                    if "Text Pointer" in k:
+                        yield k, "Text Pointer", f"sector {e}.{s} door {n}"
+
+def CheckFused(patterns, fused, groups, text):
+    "Check that one pass of a fused pattern tags the same matches as a pass of each."
+    def tag(matchGroups):
+        return "<{}>".format("|".join(g or "" for g in matchGroups))
+    separate = text
+    for p in patterns:
+        separate = p.sub(lambda m: tag(m.groups()), separate)
+    assert fused.sub(lambda m: tag(m.groups()[groups[m.lastgroup]]), text) == separate
+
+def test_RE_REPLACE_FUSED():
+    CheckFused(RE_REPLACE, RE_REPLACE_FUSED, RE_REPLACE_GROUPS,
+               "[0D 00][04 01 00][0B 05][1F EB 02 06][1D 00 01 02][1F EC FF 05][13]"
+               "[1F 00 00 05][1F EB 02 07][1F EC 01 02] [0F]")
+
+def test_RE_REPLACE_PARTS():
+    for cc, template in RE_REPLACE_TARGETS.items():
+        parts = RE_REPLACE_PARTS[cc]
+        values = [str(n) for n in range(1, len(parts))]
+        assert template.format(*values) == "".join(
+            p for pair in zip(parts, values + [""]) for p in pair)
+
+def test_COMBO_LENGTHS():
+    expected = {0x1B02: 5, 0x1B00: 1, 0x1E09: 5, 0x1E00: 3, 0x0903: 13, 0x180B: 0, 0x1F22: None}
+    for code, length in expected.items():
+        assert COMBO_LENGTHS[code] == length
+
+# Sample pointer-bearing control codes, one per entry of PATTERNS.
+POINTER_CODE_SAMPLES = [
+    b"\x06\x01\x00\x00\x00\xc1\x00", b"\x08\x10\x00\xc1\x00",
+    b"\x09\x02\x20\x00\xc1\x00\x00\x00\x00\x00", b"\x0a\x40\x00\xc1\x00",
+    b"\x1a\x01" + bytes(range(0x50, 0x60)) + b"\x05", b"\x1b\x02\x60\x00\xc1\x00",
+    b"\x1f\x63\x70\x00\xc1\x00", b"\x1f\xc0\x02\x80\x00\xc1\x00\x90\x00\xc1\x00"]
+
+def test_PATTERNS_FUSED():
+    text = " [06 01] ".join(f"[{code.hex(' ').upper()}]" for code in POINTER_CODE_SAMPLES)
+    CheckFused(PATTERNS_RE, PATTERNS_FUSED, PATTERNS_GROUPS, text)
+
 ##################
 # CCScriptWriter #
 ##################
@@ -291,39 +428,44 @@ class CCScriptWriter:
 
         # Declare our variables.
         self.asmPointers = {}
-        self.data = array.array("B")
+        self.coilSnakeData = {}
+        self.compressedText = {}
+        self.controlCodeText = {}
+        self.data = None
         self.dialogue = {}
         self.dataFiles = {}
+        # Pick the single- or multi-pointer label handler for each pattern.
+        self.labelHandlers = {f"p{i}": self.replacePointersWithLabels if p.groups > 2
+                              else self.replacePointerWithLabel
+                              for i, p in enumerate(PATTERNS_RE)}
+        self.labels = {}
         self.outputDirectory = outputDirectory
-        self.pointers = []
+        self.pointers = set()
         self.raw = raw
+        self.rom = None
         self.splitjumps = splitjumps
         self.specialPointers = {}
 
-        # Get the data from the ROM file.
-        self.data.fromfile(romFile, int(os.path.getsize(romFile.name)))
+        # Map the ROM file into memory; the mapping outlives the file object.
+        self.rom = mmap.mmap(romFile.fileno(), 0, access=mmap.ACCESS_READ)
+        romFile.close()
+        self.data = memoryview(self.rom)
+
+        # Check for a headered HiROM, then a headered LoROM.
+        for checksum in (0x101dc, 0x81dc):
+            try:
+                if ~self.data[checksum] & 0xff == self.data[checksum + 2] \
+                  and ~self.data[checksum + 1] & 0xff == self.data[checksum + 3] \
+                  and self.data[0xffc0+0x200:0xffc0 + 0x200 + len(D)].tolist() == D:
+                    self.data = self.data[0x200:]
+            except IndexError:
+                pass
 
-        # Check for a headered HiROM.
-        try:
-            if ~self.data[0x101dc] & 0xff == self.data[0x101de] \
-              and ~self.data[0x101dd] & 0xff == self.data[0x101df] \
-              and self.data[0xffc0+0x200:0xffc0 + 0x200 + len(D)].tolist() == D:
-                self.data = self.data[0x200:]
-            romFile.close()
-        except IndexError:
-            pass
-
-        # Check for a headered LoROM.
-        try:
-            if ~self.data[0x81dc] & 0xff == self.data[0x81de] \
-              and ~self.data[0x81dd] & 0xff == self.data[0x81df] \
-              and self.data[0xffc0+0x200:0xffc0 + 0x200 + len(D)].tolist() == D:
-                self.data = self.data[0x200:]
-        except IndexError:
-            pass
+    # Releases the memory-mapped ROM; the writer can't be used afterwards.
+    def close(self):
 
-        if self.data is None:
-            raise ValueError("Invalid EarthBound ROM. Aborting.")
+        self.data.release()
+        self.rom.close()
 
     # Loads the dialogue from the text banks in the ROM.
     def loadDialogue(self, loadCoilSnake=False):
@@ -346,66 +488,47 @@ class CCScriptWriter:
             self.loadCoilSnakeDialogue()
 
         # Find the special pointed-to locations.
-        for p in SPECIAL_POINTERS:
-            address = ""
-            i = p
-            while i < p + 4:
-                address += " {}".format(FormatHex(self.data[i]))
-                i += 1
-            self.pointers.append(FromSNES(address))
+        specialAddresses = {p: FromSNESBytes(self.data[p:p + 4]) for p in SPECIAL_POINTERS}
+        self.pointers.update(specialAddresses.values())
 
         # Add new blocks as needed by the pointers.
         print("Checking pointers...")
-        pointers = [_f for _f in sorted(set(self.pointers)) if _f]
-        self.pointers = []
-        for address in self.dialogue:
-            if address in pointers:
-                pointers.remove(address)
+        pointers = sorted(p for p in self.pointers - self.dialogue.keys() if p)
+        self.pointers = set()
+        blocks = sorted(self.dialogue)
         for pointer in pointers:
-            lower = FindClosest(self.dialogue, pointer)
+            lower = FindClosest(blocks, pointer)
             assert lower is not None, f"Unable to find closest block for pointer {pointer:#06x}"
             block, i = self.getText(lower - 0xc00000, pointer - 0xc00000)
             self.dialogue[lower] = ["{}[0A {}]".format(block[0],
                                                        ToSNES(pointer)),
                                     block[1]]
             self.dialogue[pointer], i = self.getText(pointer - 0xc00000)
+            bisect.insort(blocks, pointer)
 
-        # Assign each group to its output file.
-        for k, block in enumerate(sorted(self.dialogue)):
-            self.dataFiles[block] = "data_{0:0>2}".format(k // 100)
+        # Assign each group of 100 blocks to its output file (sharing one name string).
+        for start in range(0, len(blocks), 100):
+            dataFile = "data_{0:0>2}".format(start // 100)
+            for block in blocks[start:start + 100]:
+                self.dataFiles[block] = dataFile
+                self.labels[block] = "{}.l_{}".format(dataFile, hex(block))
 
         # Add special pointer locations.
-        for p in SPECIAL_POINTERS:
-            address = ""
-            i = p
-            while i < p + 4:
-                address += " {}".format(FormatHex(self.data[i]))
-                i += 1
-            address = FromSNES(address)
-            m = self.dataFiles[address]
-            h = hex(address)
-            self.specialPointers[p] = "[{{e({}.l_{})}}]".format(m, h)
+        for p, address in specialAddresses.items():
+            self.specialPointers[p] = "[{{e({})}}]".format(self.labels[address])
         for a in ASM_POINTERS:
             if self.data[a + 3] == 0x85:
-                address = FromSNES("{} {} {} {}".format(
-                                   FormatHex(self.data[a + 1]),
-                                   FormatHex(self.data[a + 2]),
-                                   FormatHex(self.data[a + 6]),
-                                   FormatHex(self.data[a + 7])))
+                address = FromSNESBytes((self.data[a + 1], self.data[a + 2],
+                                         self.data[a + 6], self.data[a + 7]))
                 t = 0
             elif self.data[a + 3] == 0x8d:
-                address = FromSNES("{} {} {} {}".format(
-                                   FormatHex(self.data[a + 1]),
-                                   FormatHex(self.data[a + 2]),
-                                   FormatHex(self.data[a + 7]),
-                                   FormatHex(self.data[a + 8])))
+                address = FromSNESBytes((self.data[a + 1], self.data[a + 2],
+                                         self.data[a + 7], self.data[a + 8]))
                 t = 1
             else:
                 assert False, (f"ROM at ${a:#06x} doesn't look like an ASM address load. "
                                "Is this a vanilla ROM?")
-            m = self.dataFiles[address]
-            h = hex(address)
-            self.asmPointers[a] = ["{}.l_{}".format(m, h), t]
+            self.asmPointers[a] = [self.labels[address], t]
 
     def loadCoilSnakeDialogue(self):
         "Load pointers from the CoilSnake project."
@@ -417,60 +540,48 @@ class CCScriptWriter:
         except IOError as exc:
             raise ValueError(f"Failed to open \"{project}\". Invalid CoilSnake project. "
                              "Aborting.") from exc
-        # pylint: disable=too-many-nested-blocks
         for fileName in COILSNAKE_FILES:
             with open(os.path.join(o, fileName), "r", encoding="utf8") as csFile:
                 yamlData = yaml.load(csFile, Loader=yaml.CSafeLoader)
-            if fileName != "map_doors.yml":
-                for v in yamlData.values():
-                    for p in COILSNAKE_POINTERS:
-                        if p not in v:
-                            continue
-                        pointer = CoilSnakePointerStringToInt(v[p])
-                        if pointer >= 0xc00000 and pointer not in self.dialogue:
-                            self.pointers.append(pointer)
-            else:
-                p = "Text Pointer"
-                for v in yamlData.values():
-                    for d in v.values():
-                        if not d:
-                            continue
-                        for k in d:
-                            if p not in k:
-                                continue
-                            pointer = CoilSnakePointerStringToInt(k[p])
-                            if pointer >= 0xc00000 and pointer not in self.dialogue:
-                                self.pointers.append(pointer)
+            self.coilSnakeData[fileName] = yamlData
+            for entry, p, _ in CoilSnakePointerFields(fileName, yamlData):
+                pointer = CoilSnakePointerStringToInt(entry[p])
+                if pointer >= 0xc00000 and pointer not in self.dialogue:
+                    self.pointers.add(pointer)
 
     # Performs various replacements on the dialogue blocks.
     def processDialogue(self):
 
         print("Processing dialogue...")
-        f = self.replaceWithLabel
-        for block in self.dialogue: # pylint: disable=consider-using-dict-items
-            b = self.dialogue[block][0]
-            b = "\"{}\"".format(b)
+        compressed = self.replaceCompressedText
+        ccscript = self.replaceWithCCScript
+        for block, entry in self.dialogue.items():
+            b = "\"{}\"".format(entry[0])
+            homeFile = self.dataFiles[block] + "."
 
             # Replace compressed text.
             if not self.raw:
-                b = re.sub(r"\[(15|16|17) (\w\w)\]", self.replaceCompressedText,
-                           b)
-
-            # Replace all pointers with their label form.
-            for p in PATTERNS:
-                try:
-                    b = re.sub(p, f, b)
-                except (IndexError, KeyError):
-                    continue
+                b = COMPRESSED_TEXT_RE.sub(compressed, b)
+
+            # Replace all pointers with their label form. If one can't be
+            # resolved, fall back to a pass per pattern so the others still are.
+            try:
+                b = PATTERNS_FUSED.sub(functools.partial(self.replaceWithLabel, homeFile), b)
+            except (IndexError, KeyError):
+                for p, h in zip(PATTERNS_RE, self.labelHandlers.values()):
+                    try:
+                        b = p.sub(lambda m, h=h, homeFile=homeFile: h(homeFile, *m.groups()), b)
+                    except (IndexError, KeyError):
+                        continue
 
             # Replace control codes and more with CCScript syntax.
             if not self.raw:
-                for r in REPLACE:
-                    b = b.replace(r[0], r[1])
-                for r in RE_REPLACE:
-                    b = re.sub(r, self.replaceWithCCScript, b)
+                # Ordered passes: the later entries clean up after the earlier.
+                for old, new in REPLACE:
+                    b = b.replace(old, new)
+                b = RE_REPLACE_FUSED.sub(ccscript, b)
 
-            self.dialogue[block][0] = b
+            entry[0] = b
 
     # Outputs the processed dialogue to the specified output directory.
     def outputDialogue(self, outputCoilSnake=False):
@@ -482,48 +593,47 @@ class CCScriptWriter:
         o = self.outputDirectory
 
         # Prepare the main file containing ROM addresses.
+        mainParts = []
+        m = mainParts.append
+        m(HEADER)
+        m("// DO NOT EDIT THIS FILE.\n")
+        m("\ncommand e(label) \"{long label}\"")
+        m("\ncommand _lasmptr(loc,target) {\n    ROMTBL[loc, 1, 1] = short [0] "
+          "target\n    ROMTBL[loc, 7, 1] = short [1] target\n}")
+
+        # Output each data_xx.ccs file.
+        blocks = sorted(self.dialogue)
+        numFiles = math.ceil(len(self.dialogue) / 100)
+        for i in range(numFiles + 1):
+            fileName = f"data_{i:02}.ccs"
+            dataParts = []
+            d = dataParts.append
+            d(HEADER)
+            d("command e(label) \"{long label}\"\n")
+            d("\n// Text Data\n")
+            m("\n\n// Memory Overwriting: {}".format(fileName))
+            for block in blocks[i * 100:i * 100 + 100]:
+                h = hex(block)
+                d("l_{}:\n".format(h))
+                # Every line is indented, so indent the whole block in one go.
+                text = self.dialogue[block][0]
+                d("    {}\n\n".format(text.replace("\n", "\n    ")))
+                if self.dialogue[block][1] >= 5:
+                    m("\nROM[{}] = goto({})".format(h, self.labels[block]))
+            with open(os.path.join(o, fileName), "w", encoding="utf8") as dataFile:
+                dataFile.write("".join(dataParts))
+
+        # Take care of the special pointers (both SNES and ASM type).
+        m("\n\n// Special Pointers")
+        for k, p in self.specialPointers.items():
+            m("\nROM[{}] = \"{}\"".format(hex(k + 0xc00000), p))
+        for k, p in self.asmPointers.items():
+            if p[1] == 0:
+                m("\n_asmptr({}, {})".format(hex(k + 0xc00000), p[0]))
+            elif p[1] == 1:
+                m("\n_lasmptr({}, {})".format(hex(k + 0xc00000), p[0]))
         with open(os.path.join(o, "main.ccs"), "w", encoding="utf8") as mainFile:
-            m = mainFile.write
-            m(HEADER)
-            m("// DO NOT EDIT THIS FILE.\n")
-            m("\ncommand e(label) \"{long label}\"")
-            m("\ncommand _lasmptr(loc,target) {\n    ROMTBL[loc, 1, 1] = short [0] "
-            "target\n    ROMTBL[loc, 7, 1] = short [1] target\n}")
-
-            # Output each data_xx.ccs file.
-            numFiles = math.ceil(len(self.dialogue) / 100)
-            i = 0
-            while i <= numFiles:
-                f = f"data_{i:02}."
-                fileName = f"{f}ccs"
-                with open(os.path.join(o, fileName), "w", encoding="utf8") as dataFile:
-                    d = dataFile.write
-                    d(HEADER)
-                    d("command e(label) \"{long label}\"\n")
-                    d("\n// Text Data\n")
-                    dialogue = sorted(self.dialogue)[i * 100:i * 100 + 100]
-                    m("\n\n// Memory Overwriting: {}".format(fileName))
-                    for block in dialogue:
-                        d("l_{}:\n".format(hex(block)))
-                        lines = self.dialogue[block][0].split("\n")
-                        for line in lines:
-                            l = line.replace(f, "")
-                            d("    {}\n".format(l))
-                        d("\n")
-                        if self.dialogue[block][1] >= 5:
-                            m("\nROM[{}] = goto({}l_{})".format(hex(block), f,
-                                                                hex(block)))
-                i += 1
-
-            # Take care of the special pointers (both SNES and ASM type).
-            m("\n\n// Special Pointers")
-            for k, p in self.specialPointers.items():
-                m("\nROM[{}] = \"{}\"".format(hex(k + 0xc00000), p))
-            for k, p in self.asmPointers.items():
-                if p[1] == 0:
-                    m("\n_asmptr({}, {})".format(hex(k + 0xc00000), p[0]))
-                elif p[1] == 1:
-                    m("\n_lasmptr({}, {})".format(hex(k + 0xc00000), p[0]))
+            mainFile.write("".join(mainParts))
 
         # Optionally output to the CoilSnake project.
         if outputCoilSnake:
@@ -534,54 +644,26 @@ class CCScriptWriter:
 
         print("Modifying CoilSnake project...")
         o = os.path.join(self.outputDirectory, os.path.pardir)
-        # pylint: disable=too-many-nested-blocks
         for fileName in COILSNAKE_FILES:
-            with open(os.path.join(o, fileName), "r", encoding="utf8") as csFile:
-                yamlData = yaml.load(csFile, Loader=yaml.CSafeLoader)
-            if fileName != "map_doors.yml":
-                for e, v in yamlData.items():
-                    pointers = {}
-                    for p in COILSNAKE_POINTERS:
-                        if p not in v:
-                            continue
-                        ptr = CoilSnakePointerStringToInt(v[p])
-                        if ptr >= 0xc00000:
-                            pointers[p] = ptr
-                    for k, v in pointers.items():
-                        try:
-                            f = self.dataFiles[v]
-                        except KeyError as exc:
-                            raise ValueError(
-                                f"While processing {fileName} entry {e}, couldn't find a data CCS "
-                                f"file containing `l_{hex(v)}. Are you decompiling to an "
-                                "unmodified project?") from exc
-                        yamlData[e][k] = "{}.l_{}".format(f, hex(v))
-            else:
-                p = "Text Pointer"
-                for e, v in yamlData.items():
-                    for s, d in v.items():
-                        if not d:
-                            continue
-                        for n, k in enumerate(d):
-                            pointers = {}
-                            if p not in k:
-                                continue
-                            ptr = CoilSnakePointerStringToInt(k[p])
-                            if ptr >= 0xc00000:
-                                pointers[p] = ptr
-                            for a, b in pointers.items():
-                                try:
-                                    f = self.dataFiles[b]
-                                except KeyError as exc:
-                                    raise ValueError(
-                                        f"While processing {fileName} sector {e}.{s} door {n}, "
-                                        f"couldn't find a data CCS file containing 'l_{hex(b)}'. "
-                                        "Is this a valid label?") from exc
-                                yamlData[e][s][n][a] = "{}.l_{}".format(f,
-                                                                        hex(b))
+            # Reuse the data parsed by loadCoilSnakeDialogue, if any.
+            yamlData = self.coilSnakeData.pop(fileName, None)
+            if yamlData is None:
+                with open(os.path.join(o, fileName), "r", encoding="utf8") as csFile:
+                    yamlData = yaml.load(csFile, Loader=yaml.CSafeLoader)
+            for entry, p, place in CoilSnakePointerFields(fileName, yamlData):
+                ptr = CoilSnakePointerStringToInt(entry[p])
+                if ptr < 0xc00000:
+                    continue
+                try:
+                    entry[p] = self.labels[ptr]
+                except KeyError as exc:
+                    raise ValueError(
+                        f"While processing {fileName} {place}, couldn't find a data CCS file "
+                        f"containing 'l_{hex(ptr)}'. Are you decompiling to an unmodified "
+                        "project?") from exc
             output = yaml.dump(yamlData, default_flow_style=False,
                     Dumper=yaml.CSafeDumper)
-            output = re.sub(r"Event Flag: (\d+)",
+            output = EVENT_FLAG_RE.sub(
                 lambda i: "Event Flag: " + hex(int(i.group(1))), output)
             with open(os.path.join(o, fileName), "w", encoding="utf8") as csFile:
                 csFile.write(output)
@@ -602,49 +684,57 @@ class CCScriptWriter:
         }
         fn = textFns.get(dataType)
         assert fn, f"Invalid text type {dataType}"
-        block, end = fn(i, stop)
-
-        # Check if it's referencing a location in memory.
-        for pattern in PATTERNS:
-            matches = re.findall(pattern, block)
-            for match in matches:
-                pointer = match[1].strip()
-                if len(match) < 3:
-                    self.pointers.append(FromSNES(pointer))
-                else:
-                    p = pointer.split()
-                    idx = 0
-                    while idx < len(p):
-                        a = FromSNES(" ".join(map(str, p[idx:idx + 4])))
-                        self.pointers.append(a)
-                        idx += 4
+        block, end, pointers = fn(i, stop)
+
+        # Keep track of the locations in memory it references.
+        self.pointers.update(pointers)
 
         return [block, end - start], end
 
     def getTextNormal(self, i: int, stop: int):
         blockParts = []
+        pointers = []
         normal_block_expect_02 = False
 
+        # Bind the hot lookups locally; this loop runs once per code or run.
+        data, append, matchRun = self.data, blockParts.append, TEXT_RUN_RE.match
+        # Most control codes recur, so their text is cached by their bytes.
+        controlCodeText = self.controlCodeText
+
         while i < stop:
-            c = self.data[i]
+            # Copy over a run of normal characters in one go.
+            run = matchRun(data, i, stop)
+            if run:
+                append(run.group().translate(TEXT_TABLE).decode("latin-1"))
+                i = run.end()
+                continue
+
+            c = data[i]
             i += 1
             breakOut = False
 
             # Check if it's a control code.
             if c <= 0x30:
-                code = CONTROL_CODES[c]
-                if isinstance(code, int):
-                    length = code
-                else:
+                length = CONTROL_CODE_LENGTHS[c]
+                if length is None:
                     length = self.getLength(i)
 
+                # Record the locations in memory it references.
+                if c in POINTER_CODES:
+                    pointers.extend(self.getPointers(i))
+
                 # Mark if we expect an [02] before the end of the block
-                if c == 0x19 and self.data[i] == 0x02:
+                if c == 0x19 and data[i] == 0x02:
                     normal_block_expect_02 = True
 
                 # Get the text for the control code.
-                byteStrs = [FormatHex(self.data[offs + i]) for offs in range(-1, length)]
-                ccText = f"[{' '.join(byteStrs)}]"
+                if i + length > len(data):
+                    raise ValueError(f"Truncated control code [{HEX_BYTES[c]}] at {i - 1:#x}")
+                ccBytes = bytes(data[i - 1:i + length])
+                ccText = controlCodeText.get(ccBytes)
+                if ccText is None:
+                    ccText = f"[{ccBytes.hex(' ').upper()}]"
+                    controlCodeText[ccBytes] = ccText
                 i += length
 
                 # Stop if this is a block-ending character.
@@ -654,26 +744,33 @@ class CCScriptWriter:
                 elif c in {0x02, 0x0A}:
                     breakOut = True
                 elif self.splitjumps:
-                    if BRANCHING_CODES_RE.match(ccText):
+                    if c in BRANCHING_CODES or ccBytes[:2] in BRANCHING_COMBOS:
                         breakOut = True
-            # Check if it's a special character.
-            elif c in {0x52, 0x8b, 0x8c, 0x8d}:
-                ccText = f"[{FormatHex(c)}]"
-            # Looks like it's a normal character.
+            # Otherwise, it's a special character.
             else:
-                ccText = chr(c - 0x30)
+                ccText = f"[{HEX_BYTES[c]}]"
 
-            blockParts.append(ccText)
+            append(ccText)
             if breakOut:
                 break
 
-        return ''.join(blockParts), i
+        return ''.join(blockParts), i, pointers
 
     def getTextCoffee(self, i: int, stop: int):
         blockParts = []
 
+        # Bind the hot lookups locally, as in getTextNormal.
+        data, append, matchRun = self.data, blockParts.append, COFFEE_TEXT_RUN_RE.match
+
         while i < stop:
-            c = self.data[i]
+            # Copy over a run of normal characters in one go.
+            run = matchRun(data, i, stop)
+            if run:
+                append(run.group().translate(TEXT_TABLE).decode("latin-1"))
+                i = run.end()
+                continue
+
+            c = data[i]
             i += 1
             breakOut = False
 
@@ -681,17 +778,9 @@ class CCScriptWriter:
             if c == 0x00:
                 ccText = "[ 00 ]"
                 breakOut = True
-            # Move the text over a distance noted by XX.
-            elif c == 0x01:
-                ccText = "[ 01 {} ]".format(FormatHex(self.data[i]))
-                i += 1
-            # Move the text down a distance noted by XX.
-            elif c == 0x02:
-                ccText = "[ 02 {} ]".format(FormatHex(self.data[i]))
-                i += 1
-            # Print the name of character XX (01 = Ness, XX[1,4]).
-            elif c == 0x08:
-                ccText = "[ 08 {} ]".format(FormatHex(self.data[i]))
+            # Move the text over (01)/down (02) by XX, or print character XX's name (08).
+            elif c in (0x01, 0x02, 0x08):
+                ccText = f"[ {HEX_BYTES[c]} {HEX_BYTES[data[i]]} ]"
                 i += 1
             # Drop down one line.
             elif c == 0x09:
@@ -700,164 +789,162 @@ class CCScriptWriter:
             else:
                 ccText = chr(c - 0x30)
 
-            blockParts.append(ccText)
+            append(ccText)
             if breakOut:
                 break
 
-        return ''.join(blockParts), i
+        return ''.join(blockParts), i, []
 
     def getTextStaff(self, i: int, stop: int):
         blockParts = []
         text = False
 
+        # Bind the hot lookups locally, as in getTextNormal.
+        data, append, matchRun = self.data, blockParts.append, STAFF_TEXT_RUN_RE.match
+
         while i < stop:
-            c = self.data[i]
+            # Copy over a run of text bytes in one go.
+            run = matchRun(data, i, stop)
+            if run:
+                append(f"{'[' if not text else ''} {run.group().hex(' ').upper()}")
+                text = True
+                i = run.end()
+                continue
+
+            c = data[i]
             i += 1
             breakOut = False
             if c in (0x00, 0x01, 0x02, 0x04, 0xff):
-                if not text:
-                    ccText = "[ {} ]".format(FormatHex(c))
-                else:
-                    ccText = " ][ {} ]".format(FormatHex(c))
-                    text = False
-            elif c == 0x03:
-                if not text:
-                    ccText = "[ 03 {} ]".format(FormatHex(self.data[i]))
-                else:
-                    ccText = " ][ 03 {} ]".format(FormatHex(self.data[i]))
-                    text = False
+                ccText = f"[ {HEX_BYTES[c]} ]"
+            else:  # 0x03
+                ccText = f"[ 03 {HEX_BYTES[data[i]]} ]"
                 i += 1
-            else:
-                ccText = f"{'[' if not text else ''} {FormatHex(c)}"
-                text = True
+            # Close off any text run before the code.
+            if text:
+                ccText = " ]" + ccText
+                text = False
             if c == 0x00:
                 ccText += "\"\n\""
             if c == 0xff:
                 breakOut = True
-            blockParts.append(ccText)
+            append(ccText)
             if breakOut:
                 break
 
-        return ''.join(blockParts), i
+        return ''.join(blockParts), i, []
 
     # Gets the length of a control code with variable length.
     def getLength(self, i):
 
+        c, b = self.data[i - 1], self.data[i]
+        if c == 0x1F and b == 0xC0:
+            return 2 + self.data[i + 1] * 4
+        length = COMBO_LENGTHS[c << 8 | b]
+        if length is None:
+            raise ValueError(f"Unknown control code [{HEX_BYTES[c]} {HEX_BYTES[b]}]")
+        return length
+
+    # Gets the addresses referenced by the control code just before i.
+    def getPointers(self, i):
+
         c = self.data[i - 1]
-        combos = {}
-        if c == 0x09:
-            return 1 + self.data[i] * 4
-        elif c == 0x1B:
-            if self.data[i] == 0x02 or self.data[i] == 0x03:
-                return 5
-            else:
-                return 1
-        elif c == 0x1E:
-            if self.data[i] == 0x09:
-                return 5
-            else:
-                return 3
-        elif c == 0x1F:
-            combos = {0x00: 3, 0x01: 2, 0x02: 2, 0x03: 1, 0x04: 2, 0x05: 1,
-                      0x06: 1, 0x07: 2, 0x11: 2, 0x12: 2, 0x13: 3, 0x14: 2,
-                      0x15: 6, 0x16: 4, 0x17: 6, 0x18: 8, 0x19: 8, 0x1A: 4,
-                      0x1B: 3, 0x1C: 3, 0x1D: 2, 0x1E: 4, 0x1F: 4, 0x20: 3,
-                      0x21: 2, 0x23: 3, 0x30: 1, 0x31: 1, 0x41: 2, 0x50: 1,
-                      0x51: 1, 0x52: 2, 0x60: 2, 0x61: 1, 0x62: 2, 0x63: 5,
-                      0x64: 1, 0x65: 1, 0x66: 7, 0x67: 2, 0x68: 1, 0x69: 1,
-                      0x71: 3, 0x81: 3, 0x83: 3, 0x90: 1, 0xA0: 1, 0xA1: 1,
-                      0xA2: 1, 0xB0: 1, 0xC0: None, 0xD0: 2, 0xD1: 1, 0xD2: 2,
-                      0xD3: 2, 0xE1: 4, 0xE4: 4, 0xE5: 2, 0xE6: 3, 0xE7: 3,
-                      0xE8: 2, 0xE9: 3, 0xEA: 3, 0xEB: 3, 0xEC: 3, 0xED: 1,
-                      0xEE: 3, 0xEF: 3, 0xF0: 1, 0xF1: 5, 0xF2: 5, 0xF3: 4,
-                      0xF4: 3}
-            if self.data[i] != 0xC0:
-                return combos[self.data[i]]
-            else:
-                numPointers = self.data[i + 1]
-                return 2 + numPointers * 4
-        elif c == 0x18:
-            combos = {0x00: 1, 0x01: 2, 0x02: 1, 0x03: 2, 0x04: 1, 0x05: 3,
-                      0x06: 1, 0x07: 6, 0x08: 2, 0x09: 2, 0x0A: 1, 0x0D: 3}
-        elif c == 0x19:
-            combos = {0x02: 1, 0x04: 1, 0x05: 4, 0x10: 2, 0x11: 2, 0x14: 1,
-                      0x16: 3, 0x18: 2, 0x19: 3, 0x1A: 2, 0x1B: 2, 0x1C: 3,
-                      0x1D: 3, 0x1E: 1, 0x1F: 1, 0x20: 1, 0x21: 2, 0x22: 5,
-                      0x23: 6, 0x24: 6, 0x25: 2, 0x26: 2, 0x27: 2, 0x28: 2}
-        elif c == 0x1A:
-            combos = {0x00: 18, 0x01: 18, 0x04: 1, 0x05: 3, 0x06: 2, 0x07: 1,
-                      0x08: 1, 0x09: 1, 0x0a: 1, 0x0B: 1}
-        elif c == 0x1C:
-            combos = {0x00: 2, 0x01: 2, 0x02: 2, 0x03: 2, 0x04: 1, 0x05: 2,
-                      0x06: 2, 0x07: 2, 0x08: 2, 0x09: 1, 0x0A: 5, 0x0B: 5,
-                      0x0C: 2, 0x0D: 1, 0x0E: 1, 0x0F: 1, 0x11: 2, 0x12: 2,
-                      0x13: 3, 0x14: 2, 0x15: 2}
-        elif c == 0x1D:
-            combos = {0x00: 3, 0x01: 3, 0x02: 2, 0x03: 2, 0x04: 3, 0x05: 3,
-                      0x06: 5, 0x07: 5, 0x08: 3, 0x09: 3, 0x0A: 2, 0x0B: 2,
-                      0x0C: 3, 0x0D: 4, 0x0E: 3, 0x0F: 3, 0x10: 3, 0x11: 3,
-                      0x12: 3, 0x13: 3, 0x14: 5, 0x15: 3, 0x17: 5, 0x18: 2,
-                      0x19: 2, 0x20: 1, 0x21: 2, 0x22: 1, 0x23: 2, 0x24: 2}
-        return combos.get(self.data[i], 0)
-
-    # Replaces the compressed text control codes with their values.
+        if c == 0x06:
+            start, count = i + 2, 1
+        elif c in (0x08, 0x0A):
+            start, count = i, 1
+        elif c == 0x09:
+            start, count = i + 1, self.data[i]
+        elif c == 0x1A and self.data[i] in (0x00, 0x01):
+            start, count = i + 1, 4
+        elif (c == 0x1B and self.data[i] in (0x02, 0x03)) \
+          or (c == 0x1F and self.data[i] == 0x63):
+            start, count = i + 1, 1
+        elif c == 0x1F and self.data[i] == 0xC0:
+            start, count = i + 2, self.data[i + 1]
+        else:
+            return []
+        return struct.unpack_from(f"<{count}I", self.data, start)
+
+    # Replaces the compressed text control codes with their (cached) values.
     def replaceCompressedText(self, matchObj):
 
-        bank = int(matchObj.groups()[0], 16) - 0x15
-        idx = int(matchObj.groups()[1], 16)
-        p = COMPRESSED_TEXT_PTRS + (bank * 0x100 + idx) * 4
-        pointer = self.data[p:p + 4]
-        pointer.reverse()
-        pointer = int(reduce(lambda x, y: (x << 8) | y, pointer)) - 0xc00000
-        returnString = ""
-        while self.data[pointer] != 0:
-            returnString += chr(self.data[pointer] - 0x30)
-            pointer += 1
-        return returnString
-
-    # Replaces the control code's pointer(s) with labels instead.
-    def replaceWithLabel(self, matchObj):
-
-        prefix = matchObj.groups()[0]
-        if len(matchObj.groups()) < 3:
-            pointer = matchObj.groups()[1]
-            address = FromSNES(pointer)
-            if not address:
-                return f"[{prefix}00 00 00 00]"
-            m = self.dataFiles[address]
-            h = hex(address)
-            if prefix == "0A " and not self.raw:
-                return f"\" goto({m}.l_{h}) \""
-            elif prefix == "08 " and not self.raw:
-                return f"\" call({m}.l_{h}) \""
-            else:
-                return f"[{prefix}{{e({m}.l_{h})}}]"
+        code = matchObj.group(0)
+        text = self.compressedText.get(code)
+        if text is None:
+            bank = int(matchObj.groups()[0], 16) - 0x15
+            idx = int(matchObj.groups()[1], 16)
+            p = COMPRESSED_TEXT_PTRS + (bank * 0x100 + idx) * 4
+            pointer = struct.unpack_from("<I", self.data, p)[0] - 0xc00000
+            text = COMPRESSED_STRING_RE.match(self.data, pointer).group()
+            text = text.translate(TEXT_TABLE).decode("latin-1")
+            self.compressedText[code] = text
+        return text
+
+    # Gets an address's label as seen from a block in homeFile ("data_xx.").
+    def getLabel(self, address, homeFile):
+
+        label = self.labels[address]
+        if label.startswith(homeFile):
+            return label[len(homeFile):]
+        return label
+
+    # Replaces the control code's pointer(s) with labels, seen from homeFile.
+    def replaceWithLabel(self, homeFile, matchObj):
+
+        name = matchObj.lastgroup
+        return self.labelHandlers[name](homeFile, *matchObj.groups()[PATTERNS_GROUPS[name]])
+
+    # Replaces a code's single pointer with its label.
+    def replacePointerWithLabel(self, homeFile, prefix, pointer):
+
+        address = FromSNES(pointer)
+        if not address:
+            return f"[{prefix}00 00 00 00]"
+        label = self.getLabel(address, homeFile)
+        if prefix == "0A " and not self.raw:
+            return f"\" goto({label}) \""
+        elif prefix == "08 " and not self.raw:
+            return f"\" call({label}) \""
         else:
-            pointers = matchObj.groups()[1].split()
-            returnStringParts = [f"[{prefix}"]
-            i = 0
-            while i < len(pointers):
-                address = FromSNES(" ".join(map(str, pointers[i:i + 4])))
-                if address <= 0:
-                    returnStringParts.append(" 00 00 00 00")
-                else:
-                    m = self.dataFiles[address]
-                    h = hex(address)
-                    returnStringParts.append(f" {{e({m}.l_{h})}}")
-                i += 4
-            if len(matchObj.groups()) == 4:
-                returnStringParts.append(matchObj.groups()[3])
-            returnStringParts.append("]")
-            return "".join(returnStringParts)
+            return f"[{prefix}{{e({label})}}]"
+
+    # Replaces a code's list of pointers with their labels.
+    def replacePointersWithLabels(self, homeFile, prefix, pointers, _, suffix=""):
+
+        getLabel = self.getLabel
+        returnStringParts = [f"[{prefix}"]
+        append = returnStringParts.append
+        for (address,) in struct.iter_unpack("<I", bytes.fromhex(pointers)):
+            if address <= 0:
+                append(" 00 00 00 00")
+            else:
+                append(f" {{e({getLabel(address, homeFile)})}}")
+        append(suffix + "]")
+        return "".join(returnStringParts)
 
     # Replace with CCScript syntax.
     def replaceWithCCScript(self, matchObj):
 
-        cc, *valueStrs = matchObj.groups()
-        values = [FromSNES(v) for v in valueStrs]
-        template = RE_REPLACE_TARGETS.get(cc)
-        assert template
-        return template.format(*values)
+        cc, *valueStrs = matchObj.groups()[RE_REPLACE_GROUPS[matchObj.lastgroup]]
+        parts = RE_REPLACE_PARTS.get(cc)
+        if parts is None:
+            # No CCScript form for this code; leave it as raw bytes.
+            return matchObj.group(0)
+        if len(parts) == 1:
+            return parts[0]
+        if len(parts) == 2:
+            return f"{parts[0]}{FromSNES(valueStrs[0])}{parts[1]}"
+        return f"{parts[0]}{FromSNES(valueStrs[0])}{parts[1]}{FromSNES(valueStrs[1])}{parts[2]}"
+
+def test_getPointers():
+    writer = CCScriptWriter.__new__(CCScriptWriter)
+    for code in POINTER_CODE_SAMPLES:
+        writer.data = memoryview(code)
+        text = f"[{code.hex(' ').upper()}]"
+        operands = [bytes.fromhex(m[1]) for p in PATTERNS for m in re.findall(p, text)]
+        assert len(operands) == 1
+        expected = [FromSNESBytes(operands[0][o:o + 4]) for o in range(0, len(operands[0]), 4)]
+        assert list(writer.getPointers(1)) == expected
 
 ########
 # MAIN #
@@ -866,7 +953,7 @@ class CCScriptWriter:
 def main():
     try:
         print("CCScriptWriter", VERSION)
-        start = time.time()
+        start = time.perf_counter()
 
         # Get the input and output files from the terminal.
         parser = argparse.ArgumentParser(description="Extracts the dialogue "
@@ -897,10 +984,13 @@ def main():
         else:
             output = args.output
         writer = CCScriptWriter(args.rom, output, args.raw, args.splitjumps)
-        writer.loadDialogue(args.coilsnake)
-        writer.processDialogue()
-        writer.outputDialogue(args.coilsnake)
-        print("Complete. Time: {:.2f}s".format(float(time.time() - start)))
+        try:
+            writer.loadDialogue(args.coilsnake)
+            writer.processDialogue()
+            writer.outputDialogue(args.coilsnake)
+        finally:
+            writer.close()
+        print("Complete. Time: {:.2f}s".format(time.perf_counter() - start))
     except KeyboardInterrupt:
         print("\rProgram execution aborted.")
 